@@ -1,10 +1,36 @@
 # app1.py -  Personal Finance Dashboard (corrected)
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+import numpy as np
 from datetime import datetime
+import importlib.util
 import io
 
+# Optional: LTTB downsampling for very long trend series (imported only when used,
+# like plotly itself, so cold starts without charts don't pay for it)
+HAS_RESAMPLER = importlib.util.find_spec("plotly_resampler") is not None
+
+try:
+    # Optional: JIT-compiled fused filter mask
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    # Optional: multithreaded Arrow CSV parser; also required for parquet uploads
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
+
+# Guard for pathological inputs (e.g. mis-parsed dates spanning centuries): a monthly
+# trend with more points than this is downsampled once before reaching the browser
+TREND_MAX_POINTS = 2000
+# Categories always offered in the add-transaction form
+DEFAULT_CATEGORIES = {"Groceries", "Transport", "Entertainment", "Utility", "Health", "Travel"}
+# Bar chart shows at most this many categories; the rest are summed into "Other"
+BAR_MAX_CATEGORIES = 30
+
 st.set_page_config(page_title="💸  Finance Dashboard", layout="wide", initial_sidebar_state="expanded")
 
 # ---- Styling ----
@@ -44,7 +70,12 @@ with st.container():
 def load_sample_df():
     # Safe load sample; adjust path if needed
     try:
-        df = pd.read_csv("sample_data/sample_expenses.csv")
+        df = pd.read_csv(
+            "sample_data/sample_expenses.csv",
+            engine=CSV_ENGINE,
+            parse_dates=["Date"],
+            dtype={"Category": "category", "Gender": "category"},
+        )
     except FileNotFoundError:
         # fallback small dataset
         data = [
@@ -52,23 +83,205 @@ def load_sample_df():
             {"Date": "2025-01-07", "Category": "Transport", "Amount": 60, "Notes": "Auto", "Gender": "Not specified"},
             {"Date": "2025-02-02", "Category": "Utility", "Amount": 2100, "Notes": "Electricity Bill", "Gender": "Not specified"},
         ]
-        df = pd.DataFrame(data)
+        df = pd.DataFrame(data).astype({"Category": "category", "Gender": "category", "Amount": "float64"})
+        df["Date"] = pd.to_datetime(df["Date"])
     # Ensure columns exist
     if "Gender" not in df.columns:
         df["Gender"] = "Not specified"
     return df
 
-def to_csv_bytes(df: pd.DataFrame) -> bytes:
-    return df.to_csv(index=False).encode("utf-8")
+@st.cache_data(show_spinner=False)
+def to_csv_bytes(filter_key: tuple, _df: pd.DataFrame) -> bytes:
+    # filter_key identifies the filtered frame; written straight to bytes (no str copy)
+    buf = io.BytesIO()
+    _df.to_csv(buf, index=False, encoding="utf-8")
+    return buf.getvalue()
 
 def ensure_datetime_col(df: pd.DataFrame, col="Date") -> pd.DataFrame:
-    # Coerce to datetime safely
+    # Coerce to datetime safely (no-op when already parsed at read time)
     if col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            return df
         df[col] = pd.to_datetime(df[col], errors="coerce")
     else:
         df[col] = pd.NaT
     return df
 
+def ensure_category_col(df: pd.DataFrame, col: str) -> pd.DataFrame:
+    # Store as categorical; blank cells become "" so they share the "empty" bucket
+    s = df[col]
+    if not isinstance(s.dtype, pd.CategoricalDtype):
+        s = s.astype("category")
+    if s.isna().any():
+        if "" not in s.cat.categories:
+            s = s.cat.add_categories("")
+        s = s.fillna("")
+    df[col] = s
+    return df
+
+def with_default_categories(s: pd.Series) -> pd.Series:
+    # Sorted union of the data's categories and DEFAULT_CATEGORIES, fixed once at load
+    if not pd.api.types.is_string_dtype(s.cat.categories):
+        s = s.astype(str).astype("category")
+    return s.cat.set_categories(sorted(set(s.cat.categories) | DEFAULT_CATEGORIES))
+
+def category_labels(s: pd.Series, empty_label: str) -> pd.Index:
+    # Display label per category (aligned with the codes), "" mapped to empty_label
+    labels = s.cat.categories.astype(str)
+    return labels.where(labels != "", empty_label)
+
+def category_options(s: pd.Series, empty_label: str) -> list:
+    # Sorted distinct labels of the categories actually present in the rows
+    used = pd.unique(s.cat.codes.to_numpy())
+    return np.sort(category_labels(s, empty_label)[used].unique()).tolist()
+
+def category_selection(s: pd.Series, empty_label: str, selected) -> np.ndarray:
+    # Boolean per category (indexable by the codes): is its label selected?
+    return category_labels(s, empty_label).isin(selected)
+
+if njit is not None:
+    @njit(cache=True)
+    def _fused_mask(cat_codes, gender_codes, sel_cat, sel_gender, out):
+        for i in range(len(out)):
+            out[i] = sel_cat[cat_codes[i]] and sel_gender[gender_codes[i]]
+
+def combine_masks(cat_codes, gender_codes, sel_cat, sel_gender) -> np.ndarray:
+    # Row is kept iff both its category and gender are selected
+    # (single fused loop when numba is available, NumPy lookups + AND otherwise)
+    out = np.empty(len(cat_codes), dtype=np.bool_)
+    if njit is not None:
+        _fused_mask(cat_codes, gender_codes, sel_cat, sel_gender, out)
+    else:
+        np.logical_and(sel_cat[cat_codes], sel_gender[gender_codes], out=out)
+    return out
+
+def df_fingerprint(df: pd.DataFrame) -> int:
+    # Content hash of the working dataframe; cache key for the frame passed as _df
+    return int(pd.util.hash_pandas_object(df, index=False).sum())
+
+def top_n_with_other(cat_sum: pd.DataFrame, n: int) -> pd.DataFrame:
+    # cat_sum is sorted by Amount descending; collapse the tail into one bar whose
+    # label ("Other (N more)") cannot clash with a real "Other" category
+    if len(cat_sum) <= n:
+        return cat_sum
+    head = cat_sum.head(n).astype({"Category": str})
+    label = f"Other ({len(cat_sum) - n} more)"
+    other = pd.DataFrame({"Category": [label], "Amount": [cat_sum["Amount"].iloc[n:].sum()]})
+    return pd.concat([head, other], ignore_index=True)
+
+def top_k_rows(df: pd.DataFrame, col: str, k: int) -> pd.DataFrame:
+    # Largest k rows by col via argpartition (no full sort), ordered descending
+    values = df[col].to_numpy()
+    k = min(k, len(values))
+    if k == 0:
+        return df.iloc[:0]
+    idx = np.argpartition(-values, k - 1)[:k]
+    idx = idx[np.argsort(-values[idx], kind="stable")]
+    return df.iloc[idx]
+
+@st.cache_data(show_spinner=False)
+def build_breakdown_fig(cat_items: tuple, chart_choice: str, show_percent: bool) -> dict:
+    # cat_items: ((category, amount), ...) sorted by amount descending
+    import plotly.express as px
+
+    cat_sum = pd.DataFrame(list(cat_items), columns=["Category", "Amount"])
+    if chart_choice == "Pie":
+        fig = px.pie(cat_sum, values="Amount", names="Category", title="Category share", hole=0.4)
+        if show_percent:
+            fig.update_traces(textinfo="percent+label")
+    elif chart_choice == "Bar (Category)":
+        fig = px.bar(top_n_with_other(cat_sum, BAR_MAX_CATEGORIES), x="Amount", y="Category", orientation="h", title="Spending by Category", text="Amount")
+        fig.update_layout(yaxis={"categoryorder": "total ascending"})
+    elif chart_choice == "Treemap":
+        fig = px.treemap(cat_sum, path=["Category"], values="Amount", title="Spending Treemap")
+    else:
+        fig = px.pie(cat_sum, values="Amount", names="Category", title="Category share")
+    return fig.to_dict()
+
+@st.cache_data(show_spinner=False)
+def build_trend_fig(month_items: tuple, render_mode: str) -> dict:
+    # month_items: (("YYYY-MM", amount), ...) in month order
+    import plotly.express as px
+
+    monthly = pd.DataFrame(list(month_items), columns=["Month", "Amount"])
+    fig = px.line(monthly, x="Month", y="Amount", markers=True, title="Monthly expense trend", render_mode=render_mode)
+    if HAS_RESAMPLER and len(monthly) > TREND_MAX_POINTS:
+        from plotly_resampler import FigureResampler
+
+        names = [trace.name for trace in fig.data]
+        fig = FigureResampler(fig, default_n_shown_samples=TREND_MAX_POINTS)
+        # No Dash callback inside st.plotly_chart, so drop the "[R] ~46D" resampling labels
+        for trace, name in zip(fig.data, names):
+            trace.name = name
+    return fig.to_dict()
+
+@st.fragment
+def breakdown_chart(cat_items: tuple):
+    # Chart type / label toggles live here, so changing them reruns only this block
+    ctl_a, ctl_b = st.columns([3, 2])
+    chart_choice = ctl_a.selectbox("Chart Type", options=["Pie", "Bar (Category)", "Monthly line", "Treemap"], index=0)
+    show_percent = ctl_b.checkbox("Show pie % labels", value=True)
+    if cat_items:
+        import plotly.graph_objects as go
+
+        fig = build_breakdown_fig(cat_items, chart_choice, show_percent)
+        st.plotly_chart(go.Figure(fig), use_container_width=True)
+    else:
+        st.info("No data for the selected filters to display chart.")
+
+@st.fragment
+def raw_data_block(dff: pd.DataFrame):
+    # Toggling the raw view reruns only this block (no refilter, no chart rebuild)
+    if st.checkbox("Show raw data", value=False):
+        with st.expander("Raw data (first 200 rows)"):
+            # Slice first so only the displayed rows are copied and formatted
+            df_show = dff.head(200).copy()
+            if "Date" in df_show.columns:
+                df_show["Date"] = df_show["Date"].dt.strftime("%Y-%m-%d").fillna("")
+            st.dataframe(df_show, use_container_width=True)
+
+@st.cache_data(show_spinner=False)
+def sorted_by_date(df_hash, _df):
+    # Working frame ordered by Date (NaT last) so date ranges become slices
+    return _df.sort_values("Date", kind="stable", na_position="last").reset_index(drop=True)
+
+@st.cache_data(show_spinner=False)
+def compute_filtered(df_hash, _df, selected_cats, selected_genders, start_ts, end_ts):
+    # _df is not hashed by Streamlit; df_hash (its content hash) keys the cache
+    df = sorted_by_date(df_hash, _df)
+
+    # Date range via binary search on the sorted column; NaT rows sort past any end date
+    lo = df["Date"].searchsorted(start_ts, side="left")
+    hi = df["Date"].searchsorted(end_ts, side="right")
+    df = df.iloc[lo:hi]
+
+    # Ensure Category and Gender comparisons don't break with empty strings
+    sel_cat = category_selection(df["Category"], "(empty)", selected_cats)
+    sel_gender = category_selection(df["Gender"], "Not specified", selected_genders)
+    mask = combine_masks(
+        df["Category"].cat.codes.to_numpy(), df["Gender"].cat.codes.to_numpy(), sel_cat, sel_gender
+    )
+    dff = df.loc[mask]
+
+    # Integer month key (year*12 + month-1); the date slice above already dropped NaT
+    month_key = (dff["Date"].dt.year * 12 + dff["Date"].dt.month - 1).astype("int32")
+
+    # Aggregates used by the visuals block
+    # One categorical groupby pass feeds the breakdown charts and the KPIs
+    cat_agg = (
+        dff.groupby("Category", observed=True, sort=False)["Amount"].agg(["sum", "count", "max"])
+        .sort_values("sum", ascending=False)
+        .reset_index()
+    )
+    monthly_agg = dff["Amount"].groupby(month_key.rename("MonthKey")).sum()
+    # Only the aggregated keys are formatted as "YYYY-MM" labels
+    monthly_agg = pd.DataFrame({
+        "Month": [f"{k // 12:04d}-{k % 12 + 1:02d}" for k in monthly_agg.index],
+        "Amount": monthly_agg.to_numpy(),
+    })
+    top5 = top_k_rows(dff, "Amount", 5)[["Date", "Category", "Amount", "Notes", "Gender"]]
+    return dff, monthly_agg, cat_agg, top5
+
 # ---- Sidebar: data source and input form ----
 st.sidebar.header("Data & Input")
 
@@ -77,13 +290,16 @@ data_source = st.sidebar.radio("Load data from:", ("Load sample (recommended)",
 df = None
 uploaded_file = None
 if data_source == "Upload file":
-    uploaded_file = st.sidebar.file_uploader("Upload CSV/Excel", type=["csv", "xlsx"])
+    uploaded_file = st.sidebar.file_uploader("Upload CSV/Excel/Parquet", type=["csv", "xlsx", "parquet"])
     if uploaded_file is not None:
         try:
-            if uploaded_file.name.lower().endswith(".csv"):
-                df = pd.read_csv(uploaded_file)
+            name = uploaded_file.name.lower()
+            if name.endswith(".csv"):
+                df = pd.read_csv(uploaded_file, engine=CSV_ENGINE, dtype={"Category": "category", "Gender": "category"})
+            elif name.endswith(".parquet"):
+                df = pd.read_parquet(uploaded_file, engine="pyarrow")
             else:
-                df = pd.read_excel(uploaded_file)
+                df = pd.read_excel(uploaded_file, dtype={"Category": "category", "Gender": "category"})
         except Exception as e:
             st.sidebar.error("Error reading file: " + str(e))
 else:
@@ -98,24 +314,51 @@ for col in ["Category", "Amount", "Notes", "Gender"]:
     if col not in df.columns:
         df[col] = "" if col != "Amount" else 0
 
+# Imported Tags column: fold into Notes the same way the form does, column-wise
+if "Tags" in df.columns:
+    tags = df["Tags"].fillna("").astype(str)
+    has_tags = tags != ""
+    notes_col = df["Notes"].fillna("").astype(str)
+    df["Notes"] = notes_col.where(~has_tags, notes_col.str.cat(tags, sep=" | Tags: ").str.strip())
+    df = df.drop(columns="Tags")
+
 # Ensure Date column is datetime (coerce invalid)
 df = ensure_datetime_col(df, "Date")
 
-# Normalize types: Amount numeric
-df["Amount"] = pd.to_numeric(df["Amount"], errors="coerce").fillna(0.0)
+# Normalize types: Amount numeric (bad cells coerced to 0), Category/Gender categorical
+if not pd.api.types.is_numeric_dtype(df["Amount"]):
+    df["Amount"] = pd.to_numeric(df["Amount"], errors="coerce")
+if df["Amount"].hasnans:
+    df["Amount"] = df["Amount"].fillna(0.0)
+for col in ["Category", "Gender"]:
+    df = ensure_category_col(df, col)
+df["Category"] = with_default_categories(df["Category"])
 
 # Fill NaT Date with today's date for display convenience (but keep NaT if needed)
 # (We will show NaT rows but avoid crashing)
 # df["Date"].fillna(pd.Timestamp.today(), inplace=True)
 
 # ---- Sidebar: Add new transaction form ----
+# Submitted rows are buffered in session state and merged into df once per run.
+# In entry mode they wait in "pending_rows" and charts are not rebuilt until applied.
+st.session_state.setdefault("new_rows", [])
+st.session_state.setdefault("pending_rows", [])
+
+def apply_pending_rows():
+    # Button callback: runs before the rerun, so charts are rebuilt once with all rows
+    st.session_state["new_rows"].extend(st.session_state["pending_rows"])
+    st.session_state["pending_rows"] = []
+    st.session_state["entry_mode"] = False
+
 st.sidebar.markdown("---")
 st.sidebar.subheader("Add new transaction (session only)")
+entry_mode = st.sidebar.checkbox("Entry mode (add several, then apply)", key="entry_mode")
 
 with st.sidebar.form("add_txn", clear_on_submit=True):
     gender = st.radio("Gender", options=["Male", "Female", "Other", "Prefer not to say"], index=3)
-    # category options combine existing and some defaults
-    cat_options = sorted(set(df["Category"].astype(str).unique().tolist() + ["Groceries", "Transport", "Entertainment", "Utility", "Health", "Travel"]))
+    # category options combine existing and some defaults (already sorted in the dtype)
+    # (blank categories are not offered, so "" never becomes the default)
+    cat_options = [c for c in df["Category"].cat.categories if c != ""]
     cat = st.selectbox("Category", options=cat_options, index=0)
     date_input = st.date_input("Date", value=datetime.today())
     amount = st.number_input("Amount (₹)", min_value=0.0, step=1.0, format="%.2f")
@@ -124,43 +367,59 @@ with st.sidebar.form("add_txn", clear_on_submit=True):
     submit = st.form_submit_button("Submit transaction")
 
 if submit:
+    tags_suffix = f" | Tags: {', '.join(tags)}" if tags else ""
     new_row = {
         "Date": pd.to_datetime(date_input),
         "Category": cat,
         "Amount": float(amount),
-        "Notes": notes or "",
+        "Notes": ((notes or "") + tags_suffix).strip(),
         "Gender": gender,
     }
-    if tags:
-        new_row["Notes"] = (new_row["Notes"] + " | Tags: " + ", ".join(tags)).strip()
-    # append to df (in-memory only for this session)
-    df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-    st.sidebar.success("Added ✅ — this change is in-memory for this session.")
+    # buffer the row (in-memory only for this session)
+    if entry_mode:
+        st.session_state["pending_rows"].append(new_row)
+    else:
+        st.session_state["new_rows"].append(new_row)
+        st.sidebar.success("Added ✅ — this change is in-memory for this session.")
+
+n_pending = len(st.session_state["pending_rows"])
+if n_pending:
+    st.sidebar.info(f"{n_pending} pending transaction(s) not yet shown in charts.")
+    st.sidebar.button(f"Apply {n_pending} pending transactions", on_click=apply_pending_rows)
+
+# Materialize buffered rows with a single concat
+if st.session_state["new_rows"]:
+    extra = pd.DataFrame(st.session_state["new_rows"])
+    df = pd.concat([df, extra], ignore_index=True)
+    for col in ["Category", "Gender"]:
+        df = ensure_category_col(df, col)
+
+# ---- Sidebar: rendering ----
+st.sidebar.markdown("---")
+st.sidebar.subheader("Rendering")
+render_mode = st.sidebar.radio(
+    "Trend chart renderer", ("webgl", "svg"),
+    help="Switch to svg if charts do not show up (e.g. WebGL disabled in the browser).",
+)
 
-# ---- Main layout: Filters & display controls ----
+# ---- Main layout: Filters ----
+# (display toggles live inside the chart / raw data fragments below)
 st.markdown("")  # spacer
 with st.container():
-    left_col, right_col = st.columns([3, 1])
-    with left_col:
-        st.markdown("### Filters & Controls")
-        cats_all = sorted(df["Category"].astype(str).replace("", "(empty)").unique())
-        selected_cats = st.multiselect("Categories", options=cats_all, default=cats_all)
-        genders_all = sorted(df["Gender"].astype(str).replace("", "Not specified").unique())
-        selected_genders = st.multiselect("Genders", options=genders_all, default=genders_all)
-        # Date inputs: default to min/max in df if available, else current month
-        if not df["Date"].dropna().empty:
-            min_date = df["Date"].min().date()
-            max_date = df["Date"].max().date()
-        else:
-            today = datetime.today().date()
-            min_date = today
-            max_date = today
-        dr = st.date_input("Date range", value=(min_date, max_date))
-    with right_col:
-        st.markdown("### Display")
-        show_raw = st.checkbox("Show raw data", value=False)
-        show_percent = st.checkbox("Show pie % labels", value=True)
-        chart_choice = st.selectbox("Chart Type", options=["Pie", "Bar (Category)", "Monthly line", "Treemap"], index=0)
+    st.markdown("### Filters & Controls")
+    cats_all = category_options(df["Category"], "(empty)")
+    selected_cats = st.multiselect("Categories", options=cats_all, default=cats_all)
+    genders_all = category_options(df["Gender"], "Not specified")
+    selected_genders = st.multiselect("Genders", options=genders_all, default=genders_all)
+    # Date inputs: default to min/max in df if available, else current month
+    if not df["Date"].dropna().empty:
+        min_date = df["Date"].min().date()
+        max_date = df["Date"].max().date()
+    else:
+        today = datetime.today().date()
+        min_date = today
+        max_date = today
+    dr = st.date_input("Date range", value=(min_date, max_date))
 
 # Apply filters safely
 start_date, end_date = dr
@@ -168,84 +427,56 @@ start_date, end_date = dr
 start_ts = pd.to_datetime(start_date)
 end_ts = pd.to_datetime(end_date)
 
-# Ensure Category and Gender comparisons don't break with empty strings
-mask_cat = df["Category"].astype(str).replace("", "(empty)").isin(selected_cats)
-mask_gender = df["Gender"].astype(str).replace("", "Not specified").isin(selected_genders)
-
-# For Date between, coerce Date to datetime already done; rows with NaT will be False
-mask_date = df["Date"].between(start_ts, end_ts)
-
-mask = mask_cat & mask_gender & mask_date
-dff = df.loc[mask].copy()
-
-# Ensure Date column is datetime here as well (defensive)
-dff = ensure_datetime_col(dff, "Date")
-
-# Create Month column safely; if Date is NaT, Month will be NaN string "NaT"
-if not dff.empty and dff["Date"].notna().any():
-    dff["Month"] = dff["Date"].dt.to_period("M").astype(str)
-else:
-    dff["Month"] = ""
+df_hash = df_fingerprint(df)
+filter_key = (df_hash, tuple(selected_cats), tuple(selected_genders), start_ts, end_ts)
+dff, monthly, cat_agg, top5 = compute_filtered(
+    df_hash, df, tuple(selected_cats), tuple(selected_genders), start_ts, end_ts
+)
 
 # ---- KPIs ----
-total = dff["Amount"].sum()
-avg = dff["Amount"].mean() if len(dff) else 0.0
-count = len(dff)
+# Read from the per-category aggregates (no pass over the filtered rows)
+total = cat_agg["sum"].sum()
+count = int(cat_agg["count"].sum())
+avg = total / count if count else 0.0
+max_amount = cat_agg["max"].max() if count else 0.0
 
 k1, k2, k3, k4 = st.columns([2, 2, 2, 2])
 k1.markdown(f'<div class="card"><div class="kpi">Total</div><div style="font-size:18px;font-weight:700">₹{total:,.2f}</div><div style="opacity:0.7">Transactions: {count}</div></div>', unsafe_allow_html=True)
 k2.markdown(f'<div class="card"><div class="kpi">Average</div><div style="font-size:18px;font-weight:700">₹{avg:,.2f}</div><div style="opacity:0.7">Per transaction</div></div>', unsafe_allow_html=True)
-k3.markdown(f'<div class="card"><div class="kpi">Max</div><div style="font-size:18px;font-weight:700">₹{dff["Amount"].max() if count else 0:,.2f}</div><div style="opacity:0.7">Largest single</div></div>', unsafe_allow_html=True)
-k4.download_button("⬇️ Download CSV", data=to_csv_bytes(dff), file_name="filtered_expenses.csv", mime="text/csv")
-
-# ---- Visuals ----
-st.markdown("## Visuals")
-col_a, col_b = st.columns([2, 3])
-
-with col_a:
-    st.markdown("### Breakdown")
-    if not dff.empty:
-        if chart_choice == "Pie":
-            fig = px.pie(dff, values="Amount", names="Category", title="Category share", hole=0.4)
-            if show_percent:
-                fig.update_traces(textinfo="percent+label")
-        elif chart_choice == "Bar (Category)":
-            cat_sum = dff.groupby("Category", as_index=False)["Amount"].sum().sort_values("Amount", ascending=False)
-            fig = px.bar(cat_sum, x="Amount", y="Category", orientation="h", title="Spending by Category", text="Amount")
-            fig.update_layout(yaxis={"categoryorder": "total ascending"})
-        elif chart_choice == "Treemap":
-            fig = px.treemap(dff, path=["Category"], values="Amount", title="Spending Treemap")
-        else:
-            fig = px.pie(dff, values="Amount", names="Category", title="Category share")
-        st.plotly_chart(fig, use_container_width=True)
-    else:
-        st.info("No data for the selected filters to display chart.")
+k3.markdown(f'<div class="card"><div class="kpi">Max</div><div style="font-size:18px;font-weight:700">₹{max_amount:,.2f}</div><div style="opacity:0.7">Largest single</div></div>', unsafe_allow_html=True)
+k4.download_button("⬇️ Download CSV", data=to_csv_bytes(filter_key, dff), file_name="filtered_expenses.csv", mime="text/csv")
 
-with col_b:
-    st.markdown("### Trend & Top items")
-    if not dff.empty and dff["Month"].astype(bool).any():
-        monthly = (dff.groupby("Month", as_index=False)["Amount"].sum().sort_values("Month"))
-        fig2 = px.line(monthly, x="Month", y="Amount", markers=True, title="Monthly expense trend")
-        st.plotly_chart(fig2, use_container_width=True)
-    else:
-        st.info("No monthly trend data available for current filters.")
-
-    if not dff.empty:
-        st.markdown("Top 5 largest transactions")
-        top5 = dff.nlargest(5, "Amount")[["Date", "Category", "Amount", "Notes", "Gender"]]
-        # Format Date column for display
-        top5_display = top5.copy()
-        if "Date" in top5_display.columns:
-            top5_display["Date"] = top5_display["Date"].dt.strftime("%Y-%m-%d").fillna("")
-        st.table(top5_display.reset_index(drop=True))
-
-# ---- Optional raw data ----
-if show_raw:
-    with st.expander("Raw data (first 200 rows)"):
-        df_show = dff.copy()
-        if "Date" in df_show.columns:
-            df_show["Date"] = df_show["Date"].dt.strftime("%Y-%m-%d").fillna("")
-        st.dataframe(df_show.head(200))
+if entry_mode:
+    st.info("Entry mode is on — charts are paused until pending transactions are applied.")
+else:
+    # ---- Visuals ----
+    st.markdown("## Visuals")
+    col_a, col_b = st.columns([2, 3])
+
+    with col_a:
+        st.markdown("### Breakdown")
+        breakdown_chart(tuple(zip(cat_agg["Category"].astype(str), cat_agg["sum"])))
+
+    with col_b:
+        st.markdown("### Trend & Top items")
+        if not monthly.empty:
+            import plotly.graph_objects as go
+
+            fig2 = build_trend_fig(tuple(zip(monthly["Month"], monthly["Amount"])), render_mode)
+            st.plotly_chart(go.Figure(fig2), use_container_width=True)
+        else:
+            st.info("No monthly trend data available for current filters.")
+
+        if not dff.empty:
+            st.markdown("Top 5 largest transactions")
+            # Format Date column for display (top5 is already at most 5 rows)
+            top5_display = top5.head(5).copy()
+            if "Date" in top5_display.columns:
+                top5_display["Date"] = top5_display["Date"].dt.strftime("%Y-%m-%d").fillna("")
+            st.table(top5_display.reset_index(drop=True))
+
+    # ---- Optional raw data ----
+    raw_data_block(dff)
 
 # ---- Footer tips ----
 st.markdown("---")